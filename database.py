@@ -1,17 +1,23 @@
 """
 Database Helper Functions
 
-MongoDB helper functions ready to use in your backend code.
-Import and use these functions in your API endpoints for database operations.
+Async MongoDB (Motor) helper functions ready to use in your backend code.
+Import and await these functions in your API endpoints for database operations.
 """
 
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
+import redis.asyncio as redis
+from bson import ObjectId, json_util
 from datetime import datetime, timezone
 import os
+import re
+import logging
 from dotenv import load_dotenv
-from typing import Union, Optional, Dict, Any
+from typing import Union, Optional, Dict, Any, List
 from pydantic import BaseModel
 
+logger = logging.getLogger(__name__)
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -21,12 +27,69 @@ db = None
 database_url = os.getenv("DATABASE_URL")
 database_name = os.getenv("DATABASE_NAME")
 
+# Wire compression costs CPU on both ends for mostly small documents; opt in (e.g. "zstd,snappy") per deployment
+mongo_compressors = os.getenv("MONGO_COMPRESSORS")
+
+_OID_RE = re.compile(r"[0-9a-fA-F]{24}")
+
+
+def is_object_id(s: str) -> bool:
+    # Far cheaper than ObjectId.is_valid, which raises and catches InvalidId for every malformed id
+    return _OID_RE.fullmatch(s) is not None
+
+
 if database_url and database_name:
-    _client = MongoClient(database_url)
+    _client = AsyncIOMotorClient(
+        database_url,
+        maxPoolSize=50,
+        minPoolSize=10,
+        maxIdleTimeMS=60000,
+        serverSelectionTimeoutMS=2000,
+        retryWrites=True,
+        **({"compressors": mongo_compressors} if mongo_compressors else {}),
+    )
     db = _client[database_name]
 
+# Optional read-through cache; disabled when REDIS_URL is not set
+REDIS_URL = os.getenv("REDIS_URL")
+cache = redis.from_url(REDIS_URL) if REDIS_URL else None
+
+# Collections served through the cache by get_document_by_id, with their TTL in seconds
+CACHE_TTLS: Dict[str, int] = {"campaign": 60}
+
+# Cache helpers: values round-trip through bson's JSON so datetimes and ObjectIds survive,
+# and Redis errors are logged and treated as misses
+async def cache_get_many(keys: List[str]) -> List[Any]:
+    if cache is None or not keys:
+        return [None] * len(keys)
+    try:
+        raws = await cache.mget(keys)
+    except Exception as e:
+        logger.error("cache_get_many error: %s", e)
+        return [None] * len(keys)
+    return [json_util.loads(raw) if raw else None for raw in raws]
+
+async def cache_set_many(items: Dict[str, Any], ttl: int) -> None:
+    if cache is None or not items:
+        return
+    try:
+        async with cache.pipeline(transaction=False) as pipe:
+            for key, value in items.items():
+                pipe.setex(key, ttl, json_util.dumps(value))
+            await pipe.execute()
+    except Exception as e:
+        logger.error("cache_set_many error: %s", e)
+
+async def cache_delete(*keys: str) -> None:
+    if cache is None or not keys:
+        return
+    try:
+        await cache.delete(*keys)
+    except Exception as e:
+        logger.error("cache_delete error: %s", e)
+
 # Helper functions for common database operations
-def create_document(collection_name: str, data: Union[BaseModel, dict]):
+async def create_document(collection_name: str, data: Union[BaseModel, dict]):
     """Insert a single document with timestamp"""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
@@ -37,47 +100,89 @@ def create_document(collection_name: str, data: Union[BaseModel, dict]):
     else:
         data_dict = data.copy()
 
-    data_dict['created_at'] = datetime.now(timezone.utc)
-    data_dict['updated_at'] = datetime.now(timezone.utc)
+    # Keep timestamps the caller already stamped so the stored and returned values match
+    if 'created_at' not in data_dict or 'updated_at' not in data_dict:
+        now = datetime.now(timezone.utc)
+        data_dict.setdefault('created_at', now)
+        data_dict.setdefault('updated_at', now)
 
-    result = db[collection_name].insert_one(data_dict)
+    result = await db[collection_name].insert_one(data_dict)
     return str(result.inserted_id)
 
-def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
+async def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None, projection: dict = None, sort: list = None):
     """Get documents from collection"""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
     
-    cursor = db[collection_name].find(filter_dict or {})
+    cursor = db[collection_name].find(filter_dict or {}, projection)
+    if sort:
+        cursor = cursor.sort(sort)
     if limit:
         cursor = cursor.limit(limit)
     
-    return list(cursor)
+    return await cursor.to_list(length=None)
 
-# New helpers
-def get_document_by_id(collection_name: str, doc_id: str) -> Optional[Dict[str, Any]]:
+def iter_documents(collection_name: str, filter_dict: dict = None, limit: int = None, projection: dict = None):
+    """Get an async cursor over documents, for streaming results without building a list"""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
-    from bson import ObjectId
-    try:
-        return db[collection_name].find_one({"_id": ObjectId(doc_id)})
-    except Exception:
-        return None
 
+    cursor = db[collection_name].find(filter_dict or {}, projection)
+    if limit:
+        cursor = cursor.limit(limit)
+    return cursor
 
-def update_document(collection_name: str, doc_id: str, updates: dict) -> bool:
+# New helpers
+async def get_document_by_id(collection_name: str, doc_id: str, projection: dict = None) -> Optional[Dict[str, Any]]:
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+    # The cached path re-applies the projection itself, which only works for top-level inclusions
+    if projection and not all(v in (1, True) and "." not in k for k, v in projection.items()):
+        raise ValueError(f"get_document_by_id supports only top-level inclusion projections, got {projection}")
+    # Malformed ids cannot match; reject them before parsing
+    if not is_object_id(doc_id):
+        return None
+    ttl = CACHE_TTLS.get(collection_name) if cache is not None else None
+    if not ttl:
+        try:
+            return await db[collection_name].find_one({"_id": ObjectId(doc_id)}, projection)
+        except Exception:
+            return None
+
+    key = f"{collection_name}:{doc_id}"
+    (doc,) = await cache_get_many([key])
+    if doc is None:
+        try:
+            doc = await db[collection_name].find_one({"_id": ObjectId(doc_id)})
+        except Exception:
+            return None
+        if doc is None:
+            return None
+        await cache_set_many({key: doc}, ttl)
+    # The whole document is cached so one entry serves every caller; apply the (inclusion) projection here
+    if projection:
+        return {k: v for k, v in doc.items() if k == "_id" or projection.get(k)}
+    return doc
+
+
+async def update_document(collection_name: str, doc_id: str, updates: dict) -> bool:
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
-    from bson import ObjectId
+    if not is_object_id(doc_id):
+        return False
     updates = updates.copy()
-    updates['updated_at'] = datetime.now(timezone.utc)
-    res = db[collection_name].update_one({"_id": ObjectId(doc_id)}, {"$set": updates})
+    if 'updated_at' not in updates:
+        updates['updated_at'] = datetime.now(timezone.utc)
+    res = await db[collection_name].update_one({"_id": ObjectId(doc_id)}, {"$set": updates})
+    await cache_delete(f"{collection_name}:{doc_id}")
     return res.modified_count > 0
 
 
-def delete_document(collection_name: str, doc_id: str) -> bool:
+async def delete_document(collection_name: str, doc_id: str) -> bool:
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
-    from bson import ObjectId
-    res = db[collection_name].delete_one({"_id": ObjectId(doc_id)})
+    if not is_object_id(doc_id):
+        return False
+    res = await db[collection_name].delete_one({"_id": ObjectId(doc_id)})
+    await cache_delete(f"{collection_name}:{doc_id}")
     return res.deleted_count > 0
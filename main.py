@@ -1,25 +1,63 @@
 import os
-from typing import List, Optional, Literal, Dict, Any, AsyncIterator
-from fastapi import FastAPI, HTTPException, Request
+import logging
+from typing import List, Optional, Literal, Dict, Any, AsyncIterator, Awaitable, Callable, Deque, Tuple
+from collections import deque
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, Field
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+from dotenv import load_dotenv
 from datetime import datetime, timezone, timedelta
 import math
-import requests
+import time
+import hashlib
+import re
+from urllib.parse import urlencode, quote, quote_plus
+from functools import lru_cache
 import asyncio
-import json
-from starlette.responses import StreamingResponse
+import contextlib
+import orjson
+import httpx
+from starlette.responses import Response, StreamingResponse
 
-app = FastAPI(title="Ads Studio API", version="1.8.0")
+app = FastAPI(title="Ads Studio API", version="1.8.0", default_response_class=ORJSONResponse)
 
+logger = logging.getLogger(__name__)
+
+# database.py loads .env on import; do the same here so these constants see it too
+load_dotenv()
+
+# Read once at import; handlers only check these constants
+META_APP_ID = os.getenv("META_APP_ID")
+META_APP_SECRET = os.getenv("META_APP_SECRET")
+META_REDIRECT_URI = os.getenv("META_REDIRECT_URI")
+
+# Comma-separated list of allowed origins, e.g. "https://app.example.com"; "*" allows any origin
+ALLOWED_ORIGINS = tuple(o.strip() for o in os.getenv("ALLOWED_ORIGINS", "*").split(",") if o.strip())
+
+# Explicit methods/headers let the middleware answer preflights with fixed values
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=("GET", "POST", "PATCH", "DELETE"),
+    allow_headers=("Authorization", "Content-Type"),
 )
 
+class SSEAwareGZipMiddleware(GZipMiddleware):
+    # The SSE stream must reach clients frame by frame; gzip would buffer it
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == "/api/stream":
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+app.add_middleware(SSEAwareGZipMiddleware, minimum_size=1024)
+
 # ====== Schemas ======
 class SocialAccount(BaseModel):
     platform: Literal["facebook", "instagram", "twitter", "linkedin", "tiktok"]
@@ -189,6 +227,9 @@ class CampaignAnalytics(BaseModel):
     suggestions: List[str]
     share_urls: Optional[Dict[str, str]] = None
 
+class BulkAnalyticsRequest(BaseModel):
+    campaign_ids: List[str] = Field(..., max_length=100)
+
 # ====== Top Post (for new campaigns) ======
 class TopPost(BaseModel):
     id: str
@@ -201,58 +242,186 @@ class TopPost(BaseModel):
     created_at: datetime
 
 # ====== Database helpers ======
-from database import db, create_document, get_documents, get_document_by_id, update_document  # type: ignore
+from database import db, database_url, database_name, create_document, get_documents, iter_documents, get_document_by_id, update_document, is_object_id, cache, cache_get_many, cache_set_many, cache_delete  # type: ignore
+
+_INDEXES: Tuple[Tuple[str, Any, Dict[str, Any]], ...] = (
+    # upsert_account keys on (platform, page_id) or (platform, page_name); publish looks up by the latter.
+    # Not unique: existing deployments may already hold duplicate or page-less tokens.
+    ("token", [("platform", 1), ("page_id", 1)], {}),
+    ("token", [("platform", 1), ("page_name", 1)], {}),
+    # Per-post threads are read newest-first by _id
+    ("comment", [("post_id", 1), ("_id", -1)], {}),
+    ("chat", [("post_id", 1), ("_id", -1)], {}),
+    # Mention autocomplete groups distinct string authors / page names. Named explicitly so they
+    # do not take the default author_1 / page_name_1 that a plain index may already use
+    ("comment", "author", {"name": "author_string", "partialFilterExpression": {"author": {"$type": "string"}}}),
+    ("chat", "author", {"name": "author_string", "partialFilterExpression": {"author": {"$type": "string"}}}),
+    ("token", "page_name", {"name": "page_name_string", "partialFilterExpression": {"page_name": {"$type": "string"}}}),
+)
+
+@app.on_event("startup")
+async def _ensure_indexes():
+    # create_index is a no-op when an identical index exists; a conflicting one only skips that index
+    if db is None:
+        return
+    for coll, keys, options in _INDEXES:
+        try:
+            await db[coll].create_index(keys, **options)
+        except Exception as e:
+            logger.warning("Could not ensure index %s on %s: %s", options.get("name", keys), coll, e)
+
+@app.on_event("shutdown")
+async def _close_cache():
+    if cache is not None:
+        await cache.aclose()
+
+# ====== Buffered log writes ======
+# Audit logs are not read on the request path; they are batched into one insert_many per interval
+_LOG_BUFFER: List[Dict[str, Any]] = []
+_LOG_BUFFER_MAX = 10000
+_LOG_FLUSH_INTERVAL = 0.5
+_log_flusher: Optional[asyncio.Task] = None
+_log_stop: Optional[asyncio.Event] = None
+_log_overflow = 0
+
+def _queue_log(entry: Dict[str, Any]) -> None:
+    # Bounded so a Mongo outage cannot grow memory without limit; overflow is dropped
+    global _log_overflow
+    if db is None:
+        return
+    if len(_LOG_BUFFER) < _LOG_BUFFER_MAX:
+        _LOG_BUFFER.append(entry)
+        return
+    if not _log_overflow:
+        logger.warning("Log buffer full (%d entries); dropping new log entries until it drains", _LOG_BUFFER_MAX)
+    _log_overflow += 1
+
+async def _flush_logs() -> None:
+    global _log_overflow
+    if _log_overflow:
+        logger.warning("Dropped %d log entries while the log buffer was full", _log_overflow)
+        _log_overflow = 0
+    if not _LOG_BUFFER:
+        return
+    batch = _LOG_BUFFER[:]
+    _LOG_BUFFER.clear()
+    try:
+        await db["log"].insert_many(batch, ordered=False)
+    except BulkWriteError as e:
+        # Unordered: entries other than the failed ones were still stored
+        logger.warning("Dropped %d log entries: %s", len(batch) - e.details.get("nInserted", 0), e)
+    except Exception as e:
+        logger.warning("Dropped %d log entries: %s", len(batch), e)
+
+async def _log_flush_loop(stop: asyncio.Event) -> None:
+    # Flush every interval; once shutdown sets `stop`, flush what is left and exit
+    while not stop.is_set():
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(stop.wait(), _LOG_FLUSH_INTERVAL)
+        await _flush_logs()
+
+@app.on_event("startup")
+async def _start_log_flusher():
+    global _log_flusher, _log_stop
+    _log_stop = asyncio.Event()
+    _log_flusher = asyncio.create_task(_log_flush_loop(_log_stop))
+
+@app.on_event("shutdown")
+async def _stop_log_flusher():
+    # Not cancelled, so an in-flight insert_many always completes before the final flush
+    if _log_flusher is not None:
+        _log_stop.set()
+        await _log_flusher
 
 # ====== Realtime (SSE) ======
-_listeners: List[asyncio.Queue] = []
+_SSE_PING = b"event: ping\ndata: "
+_SSE_MESSAGE = b"event: message\ndata: "
+# Sent to a listener that fell behind the ring: events were lost and it should refetch
+_SSE_RESET = _SSE_MESSAGE + b'{"type":"reset"}\n\n'
+
+class _EventHub:
+    # Fan-out through one bounded ring instead of a queue per listener: publishing is O(1)
+    # whatever the listener count. A slow client whose events fell off the ring gets a reset.
+    def __init__(self, size: int = 256):
+        self.cond = asyncio.Condition()
+        self.buf: Deque[Tuple[int, bytes]] = deque(maxlen=size)
+        self.seq = 0
+        self.listeners = 0
+
+    async def publish(self, frame: bytes) -> None:
+        async with self.cond:
+            self.seq += 1
+            self.buf.append((self.seq, frame))
+            self.cond.notify_all()
+
+    async def wait_after(self, last: int, timeout: float) -> Tuple[List[bytes], int]:
+        """Frames newer than `last` (after a reset if some were lost) and the new cursor; ([], last) on timeout."""
+        async with self.cond:
+            try:
+                await asyncio.wait_for(self.cond.wait_for(lambda: self.seq > last), timeout)
+            except asyncio.TimeoutError:
+                return [], last
+            frames = [f for n, f in self.buf if n > last]
+            if self.buf and last < self.buf[0][0] - 1:
+                frames.insert(0, _SSE_RESET)
+            return frames, self.seq
+
+_hub = _EventHub()
+
+# (second, frame): idle listeners time out together, so they share one ping per wall-clock second
+_ping_frame: Tuple[int, bytes] = (0, b"")
+
+def _ping() -> bytes:
+    global _ping_frame
+    sec = int(time.time())
+    if _ping_frame[0] != sec:
+        ts = datetime.fromtimestamp(sec, timezone.utc)
+        _ping_frame = (sec, _SSE_PING + orjson.dumps({"type": "ping", "ts": ts}) + b"\n\n")
+    return _ping_frame[1]
 
 async def _notify(event: Dict[str, Any]) -> None:
-    dead: List[asyncio.Queue] = []
-    for q in list(_listeners):
-        try:
-            await q.put(event)
-        except Exception:
-            dead.append(q)
-    for q in dead:
-        try:
-            _listeners.remove(q)
-        except ValueError:
-            pass
+    # Nobody streaming: skip encoding and the hub lock entirely
+    if not _hub.listeners:
+        return
+    # Encoded once here; every listener yields the same bytes
+    await _hub.publish(_SSE_MESSAGE + orjson.dumps(event) + b"\n\n")
 
 async def _event_generator(request: Request) -> AsyncIterator[bytes]:
-    q: asyncio.Queue = asyncio.Queue()
-    _listeners.append(q)
+    last = _hub.seq
+    _hub.listeners += 1
     try:
         # Initial hello
-        yield f"event: ping\ndata: {json.dumps({'type':'hello','ts': datetime.now(timezone.utc).isoformat()})}\n\n".encode()
+        yield _SSE_PING + orjson.dumps({"type": "hello", "ts": datetime.now(timezone.utc)}) + b"\n\n"
         while True:
             if await request.is_disconnected():
                 break
-            try:
-                evt = await asyncio.wait_for(q.get(), timeout=15)
-                payload = json.dumps(evt)
-                yield f"event: message\ndata: {payload}\n\n".encode()
-            except asyncio.TimeoutError:
-                yield f"event: ping\ndata: {json.dumps({'type':'ping','ts': datetime.now(timezone.utc).isoformat()})}\n\n".encode()
+            # Frames are yielded only after wait_after has released the hub lock
+            frames, last = await _hub.wait_after(last, timeout=15)
+            if not frames:
+                yield _ping()
+                continue
+            yield b"".join(frames)
     finally:
-        if q in _listeners:
-            _listeners.remove(q)
+        _hub.listeners -= 1
+
+# Keep proxies (nginx in particular) from caching or buffering the stream
+_SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
 
 @app.get("/api/stream")
 async def stream(request: Request):
-    return StreamingResponse(_event_generator(request), media_type="text/event-stream")
+    return StreamingResponse(_event_generator(request), media_type="text/event-stream", headers=_SSE_HEADERS)
 
 # ====== Routes ======
 @app.get("/")
-def read_root():
+async def read_root():
     return {"message": "Ads Studio Backend Running"}
 
 @app.get("/api/hello")
-def hello():
+async def hello():
     return {"message": "Hello from the backend API!"}
 
 @app.get("/test")
-def test_database():
+async def test_database():
     response = {
         "backend": "✅ Running",
         "database": "❌ Not Available",
@@ -269,7 +438,7 @@ def test_database():
             response["database_name"] = db.name if hasattr(db, "name") else "✅ Connected"
             response["connection_status"] = "Connected"
             try:
-                collections = db.list_collection_names()
+                collections = await db.list_collection_names()
                 response["collections"] = collections[:10]
                 response["database"] = "✅ Connected & Working"
             except Exception as e:
@@ -279,18 +448,23 @@ def test_database():
     except Exception as e:
         response["database"] = f"❌ Error: {str(e)[:50]}"
 
-    response["database_url"] = "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set"
-    response["database_name"] = "✅ Set" if os.getenv("DATABASE_NAME") else "❌ Not Set"
+    response["database_url"] = "✅ Set" if database_url else "❌ Not Set"
+    response["database_name"] = "✅ Set" if database_name else "❌ Not Set"
 
     return response
 
 # ===================== Campaigns =====================
+# Short-lived per-process cache of encoded top-post responses; polling clients revalidate by ETag.
+# create_campaign clears it whenever it adds a top post
+_TOPPOST_CACHE_TTL = 5.0
+_TOPPOST_CACHE_MAX = 128
+_toppost_cache: Dict[Any, Tuple[float, bytes, str]] = {}
+
 @app.post("/api/campaigns", response_model=Campaign)
-def create_campaign(payload: CampaignCreate):
-    data = payload.model_dump()
-    data["status"] = "draft"
-    new_id = create_document("campaign", data)
+async def create_campaign(payload: CampaignCreate):
+    dumped = payload.model_dump()
     now = datetime.now(timezone.utc)
+    new_id = await create_document("campaign", {**dumped, "status": "draft", "created_at": now, "updated_at": now})
 
     top_data = {
         "campaign_id": new_id,
@@ -302,75 +476,97 @@ def create_campaign(payload: CampaignCreate):
         "created_at": now,
     }
     try:
-        top_id = create_document("toppost", top_data)
+        top_id = await create_document("toppost", top_data)
+        _toppost_cache.clear()
         asyncio.create_task(_notify({"type": "toppost_created", "id": top_id, "campaign_id": new_id}))
     except Exception:
         pass
 
-    return Campaign(id=new_id, created_at=now, updated_at=now, **payload.model_dump(), status="draft")
+    # payload is already validated; dict(payload) keeps the nested SocialAccount models as-is
+    return Campaign.model_construct(id=new_id, created_at=now, updated_at=now, status="draft", **dict(payload))
+
+async def _stream_items(cursor, to_item: Callable[[Dict[str, Any]], Dict[str, Any]], first: Optional[Dict[str, Any]] = None) -> AsyncIterator[bytes]:
+    # Emit {"items": [...]} one document at a time, straight off the Mongo cursor
+    yield b'{"items":['
+    sep = b""
+    if first is not None:
+        yield orjson.dumps(to_item(first))
+        sep = b","
+    async for d in cursor:
+        yield sep + orjson.dumps(to_item(d))
+        sep = b","
+    yield b"]}"
+
+async def _stream_response(cursor, to_item: Callable[[Dict[str, Any]], Dict[str, Any]]) -> StreamingResponse:
+    # Pull the first document (and with it the first batch) before the 200 goes out,
+    # so connection and query errors still surface as an error status, not a truncated body
+    try:
+        first = await cursor.__anext__()
+    except StopAsyncIteration:
+        first = None
+    return StreamingResponse(_stream_items(cursor, to_item, first), media_type="application/json")
+
+_CAMPAIGN_FIELDS = tuple(Campaign.model_fields)
+def _item_mapper(defaults: Dict[str, Any]) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    # Merge a (projected) document over its field defaults and expose _id as a string id
+    def to_item(d: Dict[str, Any]) -> Dict[str, Any]:
+        item = {**defaults, **d}
+        item["id"] = str(item.pop("_id"))
+        return item
+    return to_item
+
+# Only the fields _campaign_item reads (_id is always returned)
+_CAMPAIGN_PROJECTION = {k: 1 for k in _CAMPAIGN_FIELDS if k != "id"}
+
+_CAMPAIGN_DEFAULTS: Dict[str, Any] = {k: None for k in _CAMPAIGN_FIELDS if k != "id"}
+_CAMPAIGN_DEFAULTS.update(duration_days=7, currency="USD", audience_interests=[], platforms=[], social_accounts=[], status="draft")
+_campaign_row = _item_mapper(_CAMPAIGN_DEFAULTS)
+
+def _campaign_item(d: Dict[str, Any]) -> Dict[str, Any]:
+    item = _campaign_row(d)
+    created_at = item["created_at"] or datetime.now(timezone.utc)
+    item["created_at"] = created_at
+    item["updated_at"] = item["updated_at"] or created_at
+    item["start_date"] = created_at
+    return item
 
 @app.get("/api/campaigns")
-def list_campaigns(limit: int = 20):
-    docs = get_documents("campaign", {}, limit)
-    items = []
-    for d in docs:
-        _id = str(d.get("_id"))
-        created_at = d.get("created_at") or datetime.now(timezone.utc)
-        updated_at = d.get("updated_at") or created_at
-        status = d.get("status", "draft")
-        items.append(
-            {
-                "id": _id,
-                "name": d.get("name"),
-                "objective": d.get("objective"),
-                "headline": d.get("headline"),
-                "primary_text": d.get("primary_text"),
-                "media_url": d.get("media_url"),
-                "call_to_action": d.get("call_to_action"),
-                "destination_url": d.get("destination_url"),
-                "daily_budget": d.get("daily_budget"),
-                "total_budget": d.get("total_budget"),
-                "duration_days": d.get("duration_days", 7),
-                "currency": d.get("currency", "USD"),
-                "start_date": created_at,
-                "end_date": d.get("end_date"),
-                "audience_location": d.get("audience_location"),
-                "audience_age_min": d.get("audience_age_min"),
-                "audience_age_max": d.get("audience_age_max"),
-                "audience_interests": d.get("audience_interests", []),
-                "platforms": d.get("platforms", []),
-                "social_accounts": d.get("social_accounts", []),
-                "status": status,
-                "created_at": created_at,
-                "updated_at": updated_at,
-            }
-        )
-    return {"items": items}
+async def list_campaigns(limit: int = 20):
+    cursor = iter_documents("campaign", {}, limit, projection=_CAMPAIGN_PROJECTION)
+    return await _stream_response(cursor, _campaign_item)
 
 # ===================== Accounts/Tokens =====================
+# Stored token fields; the response id comes from _id
+_ACCOUNT_TOKEN_FIELDS = tuple(k for k in AccountToken.model_fields if k != "id")
+_ACCOUNT_TOKEN_PROJECTION = {k: 1 for k in _ACCOUNT_TOKEN_FIELDS}
+_account_item = _item_mapper({k: None for k in _ACCOUNT_TOKEN_FIELDS})
+
+# With REDIS_URL set, publish reads each platform's token list from the cache
+_TOKEN_CACHE_TTL = 300
+_TOKEN_LOOKUP_PROJECTION = {"platform": 1, "page_name": 1, "access_token": 1}
+
+def _token_cache_key(platform: Optional[str]) -> str:
+    return f"token:{platform}"
+
+async def _platform_tokens(platforms: List[str]) -> List[Dict[str, Any]]:
+    # Hits come from one MGET; every platform that missed is fetched in a single query and cached
+    cached = await cache_get_many([_token_cache_key(p) for p in platforms])
+    docs = [d for hit in cached if hit for d in hit]
+    missing = [p for p, hit in zip(platforms, cached) if hit is None]
+    if missing:
+        fetched = await db["token"].find({"platform": {"$in": missing}}, _TOKEN_LOOKUP_PROJECTION).to_list(length=None)
+        await cache_set_many({_token_cache_key(p): [d for d in fetched if d.get("platform") == p] for p in missing}, _TOKEN_CACHE_TTL)
+        docs.extend(fetched)
+    return docs
+
 @app.get("/api/accounts", response_model=List[AccountToken])
-def list_accounts():
-    docs = get_documents("token", {})
-    items: List[AccountToken] = []
-    for d in docs:
-        items.append(
-            AccountToken(
-                id=str(d.get("_id")),
-                platform=d.get("platform"),
-                page_id=d.get("page_id"),
-                page_name=d.get("page_name"),
-                access_token=d.get("access_token"),
-                expires_at=d.get("expires_at"),
-                owner_id=d.get("owner_id"),
-                created_at=d.get("created_at"),
-                updated_at=d.get("updated_at"),
-            )
-        )
-    return items
+async def list_accounts():
+    cursor = iter_documents("token", {}, projection=_ACCOUNT_TOKEN_PROJECTION)
+    # Tokens were validated on write; hand the rows straight to the response
+    return ORJSONResponse([_account_item(d) async for d in cursor])
 
 @app.post("/api/accounts", response_model=AccountToken)
-def upsert_account(body: AccountTokenCreate):
-    from bson import ObjectId
+async def upsert_account(body: AccountTokenCreate):
     if db is None:
         raise HTTPException(status_code=500, detail="Database not available")
     key_filter = {"platform": body.platform}
@@ -378,68 +574,96 @@ def upsert_account(body: AccountTokenCreate):
         key_filter["page_id"] = body.page_id
     elif body.page_name:
         key_filter["page_name"] = body.page_name
-    existing = db["token"].find_one(key_filter)
 
+    now = datetime.now(timezone.utc)
     data = body.model_dump()
-    data["updated_at"] = datetime.now(timezone.utc)
-    if existing:
-        db["token"].update_one({"_id": existing["_id"]}, {"$set": data})
-        saved = db["token"].find_one({"_id": existing["_id"]})
-        _id = str(existing["_id"])
-        created_at = existing.get("created_at")
-    else:
-        data["created_at"] = datetime.now(timezone.utc)
-        _id = create_document("token", data)
-        saved = db["token"].find_one({"_id": ObjectId(_id)})
-        created_at = saved.get("created_at") if saved else datetime.now(timezone.utc)
+    data["updated_at"] = now
+    # One round trip, but not race-free: the key indexes are not unique, so two concurrent
+    # upserts for a new page can still both insert
+    saved = await db["token"].find_one_and_update(
+        key_filter,
+        {"$set": data, "$setOnInsert": {"created_at": now}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
 
-    return AccountToken(id=_id, created_at=created_at, updated_at=data["updated_at"], platform=body.platform, page_id=body.page_id, page_name=body.page_name, access_token=body.access_token, expires_at=body.expires_at, owner_id=body.owner_id)
+    await cache_delete(_token_cache_key(body.platform))
+
+    # data is the validated request body plus updated_at; no need to validate it again
+    return AccountToken.model_construct(id=str(saved["_id"]), created_at=saved.get("created_at") or now, **data)
 
 @app.delete("/api/accounts/{token_id}")
-def delete_account(token_id: str):
-    from bson import ObjectId
+async def delete_account(token_id: str):
     if db is None:
         raise HTTPException(status_code=500, detail="Database not available")
-    res = db["token"].delete_one({"_id": ObjectId(token_id)})
-    if res.deleted_count == 0:
+    # A malformed id cannot match anything; answer 404 without parsing it
+    if not is_object_id(token_id):
+        raise HTTPException(status_code=404, detail="Not found")
+    # The platform comes back with the delete so its cached token list can be dropped
+    deleted = await db["token"].find_one_and_delete({"_id": ObjectId(token_id)}, {"platform": 1})
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Not found")
+    await cache_delete(_token_cache_key(deleted.get("platform")))
     return {"status": "deleted"}
 
 # ===================== OAuth (Meta / WhatsApp scaffolding) =====================
+@app.on_event("startup")
+async def _check_env():
+    # Meta OAuth is optional; warn once at boot instead of failing every request silently
+    missing = [k for k, v in (("META_APP_ID", META_APP_ID), ("META_APP_SECRET", META_APP_SECRET), ("META_REDIRECT_URI", META_REDIRECT_URI)) if not v]
+    if missing:
+        logger.warning("Meta OAuth disabled, unset: %s", ", ".join(missing))
+    if db is None:
+        logger.warning("DATABASE_URL/DATABASE_NAME not set; database routes will fail")
+
+_META_DIALOG_URL = "https://www.facebook.com/v18.0/dialog/oauth"
+_META_SCOPE = "pages_manage_metadata,pages_read_engagement,pages_manage_posts,instagram_basic,instagram_content_publish,whatsapp_business_messaging,whatsapp_business_management"
+
 @app.get("/auth/meta/url")
-def get_meta_oauth_url(state: Optional[str] = None):
-    app_id = os.getenv("META_APP_ID")
-    redirect_uri = os.getenv("META_REDIRECT_URI")
-    if not app_id or not redirect_uri:
+async def get_meta_oauth_url(state: Optional[str] = None):
+    if not META_APP_ID or not META_REDIRECT_URI:
         raise HTTPException(status_code=500, detail="META_APP_ID or META_REDIRECT_URI not configured")
-    scope = "pages_manage_metadata,pages_read_engagement,pages_manage_posts,instagram_basic,instagram_content_publish,whatsapp_business_messaging,whatsapp_business_management"
-    s = state or "state"
-    url = (
-        "https://www.facebook.com/v18.0/dialog/oauth"
-        f"?client_id={app_id}&redirect_uri={redirect_uri}&state={s}&scope={scope}"
+    query = urlencode({"client_id": META_APP_ID, "redirect_uri": META_REDIRECT_URI, "state": state or "state", "scope": _META_SCOPE})
+    return {"url": f"{_META_DIALOG_URL}?{query}"}
+
+# Shared outbound client, opened at startup so the connection to graph.facebook.com stays warm.
+_http_client: Optional[httpx.AsyncClient] = None
+
+@app.on_event("startup")
+async def _open_http_client():
+    global _http_client
+    # transport retries cover connection failures only, so an OAuth code is never replayed;
+    # callbacks are sparse, so keep the idle TLS connection well past httpx's 5s default
+    _http_client = httpx.AsyncClient(
+        base_url="https://graph.facebook.com",
+        timeout=20,
+        transport=httpx.AsyncHTTPTransport(
+            retries=2,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=120),
+        ),
     )
-    return {"url": url}
+
+@app.on_event("shutdown")
+async def _close_http_client():
+    if _http_client is not None:
+        await _http_client.aclose()
 
 class MetaCallbackRequest(BaseModel):
     code: str
     state: Optional[str] = None
 
 @app.post("/auth/meta/callback")
-def meta_oauth_callback(body: MetaCallbackRequest):
-    app_id = os.getenv("META_APP_ID")
-    app_secret = os.getenv("META_APP_SECRET")
-    redirect_uri = os.getenv("META_REDIRECT_URI")
-    if not app_id or not app_secret or not redirect_uri:
+async def meta_oauth_callback(body: MetaCallbackRequest):
+    if not META_APP_ID or not META_APP_SECRET or not META_REDIRECT_URI:
         raise HTTPException(status_code=500, detail="Meta app env vars not configured")
 
-    token_url = "https://graph.facebook.com/v18.0/oauth_access_token"
     params = {
-        "client_id": app_id,
-        "client_secret": app_secret,
-        "redirect_uri": redirect_uri,
+        "client_id": META_APP_ID,
+        "client_secret": META_APP_SECRET,
+        "redirect_uri": META_REDIRECT_URI,
         "code": body.code,
     }
-    r = requests.get(token_url, params=params, timeout=20)
+    r = await _http_client.get("/v18.0/oauth_access_token", params=params)
     if r.status_code != 200:
         raise HTTPException(status_code=400, detail=f"Token exchange failed: {r.text}")
     token_payload = r.json()
@@ -449,154 +673,144 @@ def meta_oauth_callback(body: MetaCallbackRequest):
 
 # ===================== AI Content Generation =====================
 
+_GENERIC_TAGS = ("#NexusAds", "#AdTips", "#Marketing")
+
 def _gen_hashtags(keywords: List[str], platform: str) -> List[str]:
     base = [k.replace(" ", "") for k in (keywords or [])][:5]
     if platform in ("instagram", "tiktok"):
         base = [f"#{b}" for b in base]
     else:
         base = [f"#{b}" for b in base[:3]]
-    generic = ["#NexusAds", "#AdTips", "#Marketing"]
-    out = base + generic
-    seen = set()
-    uniq = []
+    out = [*base, *_GENERIC_TAGS]
+    # Case-insensitive dedupe keeping the first spelling of each tag, in order
+    first: Dict[str, str] = {}
     for h in out:
-        if h.lower() not in seen:
-            uniq.append(h)
-            seen.add(h.lower())
-        if len(uniq) >= 8:
-            break
-    return uniq
+        first.setdefault(h.lower(), h)
+    return list(first.values())[:8]
+
+_TONE_PREFIX: Dict[str, tuple] = {
+    "friendly": ("Hey there!", "Great news ✨"),
+    "professional": ("Introducing", "We are pleased to announce"),
+    "playful": ("Psst…", "Ready to level up?"),
+    "urgent": ("Limited time!", "Don’t miss out"),
+    "inspirational": ("Imagine this", "Turn your vision into reality"),
+}
+
+_PLATFORM_EMOJI = {
+    "facebook": "📣",
+    "instagram": "✨",
+    "twitter": "🚀",
+    "linkedin": "💼",
+    "tiktok": "🔥",
+}
 
 @app.post("/api/ai/generate", response_model=AIGenerateResponse)
-def ai_generate(body: AIGenerateRequest):
-    tone_prefix = {
-        "friendly": ["Hey there!", "Great news ✨"],
-        "professional": ["Introducing", "We are pleased to announce"],
-        "playful": ["Psst…", "Ready to level up?"],
-        "urgent": ["Limited time!", "Don’t miss out"],
-        "inspirational": ["Imagine this", "Turn your vision into reality"],
-    }[body.tone]
-
-    emoji = {
-        "facebook": "📣",
-        "instagram": "✨",
-        "twitter": "🚀",
-        "linkedin": "💼",
-        "tiktok": "🔥",
-    }[body.platform]
+async def ai_generate(body: AIGenerateRequest):
+    opener, closer = _TONE_PREFIX[body.tone]
+    emoji = _PLATFORM_EMOJI[body.platform]
 
     brand = f"{body.brand} — " if body.brand else ""
     cta = body.call_to_action or "Learn more"
     hashtags = _gen_hashtags(body.keywords or [], body.platform)
+    brief = body.brief.strip()
+    # Shared headline lead-in, built once for all three variations
+    head = f"{emoji} {brand} "
 
-    base_text = (
-        f"{tone_prefix[0]} {brand}{body.brief.strip()} {emoji}\n\n"
-        f"{tone_prefix[1]} {cta}."
-    )
-
+    # Every field is a str built above from the validated request, so skip re-validation
     variations = [
-        AIVariation(
-            headline=f"{emoji} {brand} {cta}",
-            primary_text=base_text,
+        AIVariation.model_construct(
+            headline=head + cta,
+            primary_text=f"{opener} {brand}{brief} {emoji}\n\n{closer} {cta}.",
             hashtags=hashtags,
         ),
-        AIVariation(
-            headline=f"{emoji} {brand} {body.brief[:60]}…",
-            primary_text=f"{tone_prefix[1]} {body.brief.strip()} — {cta}!",
+        AIVariation.model_construct(
+            headline=f"{head}{body.brief[:60]}…",
+            primary_text=f"{closer} {brief} — {cta}!",
             hashtags=hashtags,
         ),
-        AIVariation(
-            headline=f"{emoji} {brand} New: {cta}",
-            primary_text=f"{tone_prefix[0]} {body.brief.strip()}\n\n{cta} today.",
+        AIVariation.model_construct(
+            headline=f"{head}New: {cta}",
+            primary_text=f"{opener} {brief}\n\n{cta} today.",
             hashtags=hashtags,
         ),
     ]
 
-    return AIGenerateResponse(platform=body.platform, tone=body.tone, brand=body.brand, variations=variations)
+    return AIGenerateResponse.model_construct(platform=body.platform, tone=body.tone, brand=body.brand, variations=variations)
 
 # ===================== AI Image Generation Route =====================
+_STYLE_HINT = {
+    "photo": "high quality photo",
+    "3d": "3d render",
+    "illustration": "flat illustration",
+    "neon": "neon cyberpunk",
+    "minimal": "minimal clean",
+}
+
 @app.post("/api/ai/image", response_model=AIImageResponse)
-def ai_image(body: AIImageRequest):
-    style_hint = {
-        "photo": "high quality photo",
-        "3d": "3d render",
-        "illustration": "flat illustration",
-        "neon": "neon cyberpunk",
-        "minimal": "minimal clean",
-    }.get(body.style or "photo", "high quality photo")
+async def ai_image(body: AIImageRequest):
+    style_hint = _STYLE_HINT.get(body.style or "photo", "high quality photo")
 
     prompt = f"{style_hint}, {body.prompt.strip()}"
-    from urllib.parse import quote
     pw = max(256, min(2048, body.width or 1024))
     ph = max(256, min(2048, body.height or 1024))
     url = f"https://image.pollinations.ai/prompt/{quote(prompt)}?width={pw}&height={ph}&n=1"
-    return AIImageResponse(image_url=url)
+    return AIImageResponse.model_construct(image_url=url)
 
 # ===================== Simple Posts =====================
+# Missing fields come out as their defaults; projected documents are merged over these
+_POST_DEFAULTS: Dict[str, Any] = {k: None for k in Post.model_fields if k != "id"}
+_POST_DEFAULTS.update(hashtags=[], status="draft")
+_POST_PROJECTION = {k: 1 for k in _POST_DEFAULTS}
+
+_post_item = _item_mapper(_POST_DEFAULTS)
+
 @app.get("/api/posts")
-def list_posts(limit: int = 20):
-    docs = get_documents("post", {}, limit)
-    items = []
-    for d in docs:
-        items.append(
-            {
-                "id": str(d.get("_id")),
-                "platform": d.get("platform"),
-                "content": d.get("content"),
-                "media_url": d.get("media_url"),
-                "hashtags": d.get("hashtags", []),
-                "scheduled_at": d.get("scheduled_at"),
-                "status": d.get("status", "draft"),
-                "created_at": d.get("created_at"),
-                "updated_at": d.get("updated_at"),
-            }
-        )
-    return {"items": items}
+async def list_posts(limit: int = 20):
+    cursor = iter_documents("post", {}, limit, projection=_POST_PROJECTION)
+    return await _stream_response(cursor, _post_item)
 
 @app.post("/api/posts", response_model=Post)
-def create_post(body: PostCreate):
+async def create_post(body: PostCreate):
     data = body.model_dump()
     now = datetime.now(timezone.utc)
     data["created_at"] = now
     data["updated_at"] = now
     data["status"] = "scheduled" if body.scheduled_at else "queued"
-    new_id = create_document("post", data)
-    return Post(id=new_id, created_at=now, updated_at=now, status=data["status"], **body.model_dump())
+    new_id = await create_document("post", data)
+    # data already holds the validated fields plus status and timestamps; create_document copied it
+    return Post.model_construct(id=new_id, **data)
 
 # ===== Comments for Posts =====
+# Upper bound for one page of a comment or chat thread; limit=0 would drop the cap entirely
+_THREAD_LIMIT_MAX = 500
+
+_COMMENT_DEFAULTS: Dict[str, Any] = {k: None for k in Comment.model_fields if k != "id"}
+_COMMENT_PROJECTION = {k: 1 for k in _COMMENT_DEFAULTS}
+_comment_item = _item_mapper(_COMMENT_DEFAULTS)
+
 @app.get("/api/posts/{post_id}/comments", response_model=List[Comment])
-def get_post_comments(post_id: str):
-    docs = get_documents("comment", {"post_id": post_id})
-    items: List[Comment] = []
-    for d in docs:
-        items.append(
-            Comment(
-                id=str(d.get("_id")),
-                post_id=d.get("post_id"),
-                text=d.get("text"),
-                author=d.get("author"),
-                attachment_url=d.get("attachment_url"),
-                created_at=d.get("created_at"),
-                updated_at=d.get("updated_at"),
-            )
-        )
-    return items
+async def get_post_comments(post_id: str, limit: int = Query(100, ge=1, le=_THREAD_LIMIT_MAX)):
+    # Latest `limit` comments, returned oldest-first as before
+    docs = await get_documents("comment", {"post_id": post_id}, limit, projection=_COMMENT_PROJECTION, sort=[("_id", -1)])
+    docs.reverse()
+    # Stored rows need no re-validation; the model stays on the route for the OpenAPI schema
+    return ORJSONResponse([_comment_item(d) for d in docs])
 
 @app.post("/api/posts/{post_id}/comments", response_model=Comment)
-def add_post_comment(post_id: str, body: CommentCreate):
+async def add_post_comment(post_id: str, body: CommentCreate):
     now = datetime.now(timezone.utc)
     data = {"post_id": post_id, "text": body.text, "author": body.author, "attachment_url": body.attachment_url, "created_at": now, "updated_at": now}
-    comment_id = create_document("comment", data)
+    comment_id = await create_document("comment", data)
     asyncio.create_task(_notify({"type": "comment_created", "post_id": post_id, "id": comment_id}))
-    return Comment(id=comment_id, post_id=post_id, text=body.text, author=body.author, attachment_url=body.attachment_url, created_at=now, updated_at=now)
+    return Comment.model_construct(id=comment_id, post_id=post_id, text=body.text, author=body.author, attachment_url=body.attachment_url, created_at=now, updated_at=now)
 
 class CommentUpdate(BaseModel):
     text: Optional[str] = None
     attachment_url: Optional[str] = None
 
 @app.patch("/api/posts/{post_id}/comments/{comment_id}", response_model=Comment)
-def edit_post_comment(post_id: str, comment_id: str, body: CommentUpdate):
-    doc = get_document_by_id("comment", comment_id)
+async def edit_post_comment(post_id: str, comment_id: str, body: CommentUpdate):
+    doc = await get_document_by_id("comment", comment_id)
     if not doc or doc.get("post_id") != post_id:
         raise HTTPException(status_code=404, detail="Comment not found")
     changes: Dict[str, Any] = {}
@@ -605,65 +819,54 @@ def edit_post_comment(post_id: str, comment_id: str, body: CommentUpdate):
     if body.attachment_url is not None:
         changes["attachment_url"] = body.attachment_url
     changes["updated_at"] = datetime.now(timezone.utc)
-    update_document("comment", comment_id, changes)
-    updated = get_document_by_id("comment", comment_id)
+    await update_document("comment", comment_id, changes)
+    updated = await get_document_by_id("comment", comment_id, projection=_COMMENT_PROJECTION)
     asyncio.create_task(_notify({"type": "comment_updated", "post_id": post_id, "id": comment_id}))
-    return Comment(
-        id=str(updated.get("_id")),
-        post_id=updated.get("post_id"),
-        text=updated.get("text"),
-        author=updated.get("author"),
-        attachment_url=updated.get("attachment_url"),
-        created_at=updated.get("created_at"),
-        updated_at=updated.get("updated_at"),
-    )
+    return Comment.model_construct(**_comment_item(updated))
 
-@app.delete("/api/posts/{post_id}/comments/{comment_id}")
-def delete_post_comment(post_id: str, comment_id: str):
-    from bson import ObjectId
+async def _delete_in_post(collection: str, post_id: str, item_id: str) -> bool:
+    # Parse the id once and match the post in the same query: one round trip instead of two
     if db is None:
         raise HTTPException(status_code=500, detail="Database not available")
-    doc = db["comment"].find_one({"_id": ObjectId(comment_id)})
-    if not doc or doc.get("post_id") != post_id:
+    if not is_object_id(item_id):
+        return False
+    res = await db[collection].delete_one({"_id": ObjectId(item_id), "post_id": post_id})
+    return res.deleted_count > 0
+
+@app.delete("/api/posts/{post_id}/comments/{comment_id}")
+async def delete_post_comment(post_id: str, comment_id: str):
+    if not await _delete_in_post("comment", post_id, comment_id):
         raise HTTPException(status_code=404, detail="Comment not found")
-    db["comment"].delete_one({"_id": ObjectId(comment_id)})
     asyncio.create_task(_notify({"type": "comment_deleted", "post_id": post_id, "id": comment_id}))
     return {"status": "deleted"}
 
 # ===== Chat for Posts =====
+_CHAT_DEFAULTS: Dict[str, Any] = {k: None for k in ChatMessage.model_fields if k != "id"}
+_CHAT_PROJECTION = {k: 1 for k in _CHAT_DEFAULTS}
+_chat_item = _item_mapper(_CHAT_DEFAULTS)
+
 @app.get("/api/posts/{post_id}/chat", response_model=List[ChatMessage])
-def get_post_chat(post_id: str):
-    docs = get_documents("chat", {"post_id": post_id})
-    items: List[ChatMessage] = []
-    for d in docs:
-        items.append(
-            ChatMessage(
-                id=str(d.get("_id")),
-                post_id=d.get("post_id"),
-                message=d.get("message"),
-                author=d.get("author"),
-                attachment_url=d.get("attachment_url"),
-                created_at=d.get("created_at"),
-                updated_at=d.get("updated_at"),
-            )
-        )
-    return items
+async def get_post_chat(post_id: str, limit: int = Query(100, ge=1, le=_THREAD_LIMIT_MAX)):
+    # Latest `limit` messages, returned oldest-first as before
+    docs = await get_documents("chat", {"post_id": post_id}, limit, projection=_CHAT_PROJECTION, sort=[("_id", -1)])
+    docs.reverse()
+    return ORJSONResponse([_chat_item(d) for d in docs])
 
 @app.post("/api/posts/{post_id}/chat", response_model=ChatMessage)
-def add_post_chat(post_id: str, body: ChatMessageCreate):
+async def add_post_chat(post_id: str, body: ChatMessageCreate):
     now = datetime.now(timezone.utc)
     data = {"post_id": post_id, "message": body.message, "author": body.author, "attachment_url": body.attachment_url, "created_at": now, "updated_at": now}
-    chat_id = create_document("chat", data)
+    chat_id = await create_document("chat", data)
     asyncio.create_task(_notify({"type": "chat_created", "post_id": post_id, "id": chat_id}))
-    return ChatMessage(id=chat_id, post_id=post_id, message=body.message, author=body.author, attachment_url=body.attachment_url, created_at=now, updated_at=now)
+    return ChatMessage.model_construct(id=chat_id, post_id=post_id, message=body.message, author=body.author, attachment_url=body.attachment_url, created_at=now, updated_at=now)
 
 class ChatUpdate(BaseModel):
     message: Optional[str] = None
     attachment_url: Optional[str] = None
 
 @app.patch("/api/posts/{post_id}/chat/{message_id}", response_model=ChatMessage)
-def edit_post_chat(post_id: str, message_id: str, body: ChatUpdate):
-    doc = get_document_by_id("chat", message_id)
+async def edit_post_chat(post_id: str, message_id: str, body: ChatUpdate):
+    doc = await get_document_by_id("chat", message_id)
     if not doc or doc.get("post_id") != post_id:
         raise HTTPException(status_code=404, detail="Message not found")
     changes: Dict[str, Any] = {}
@@ -672,28 +875,15 @@ def edit_post_chat(post_id: str, message_id: str, body: ChatUpdate):
     if body.attachment_url is not None:
         changes["attachment_url"] = body.attachment_url
     changes["updated_at"] = datetime.now(timezone.utc)
-    update_document("chat", message_id, changes)
-    updated = get_document_by_id("chat", message_id)
+    await update_document("chat", message_id, changes)
+    updated = await get_document_by_id("chat", message_id, projection=_CHAT_PROJECTION)
     asyncio.create_task(_notify({"type": "chat_updated", "post_id": post_id, "id": message_id}))
-    return ChatMessage(
-        id=str(updated.get("_id")),
-        post_id=updated.get("post_id"),
-        message=updated.get("message"),
-        author=updated.get("author"),
-        attachment_url=updated.get("attachment_url"),
-        created_at=updated.get("created_at"),
-        updated_at=updated.get("updated_at"),
-    )
+    return ChatMessage.model_construct(**_chat_item(updated))
 
 @app.delete("/api/posts/{post_id}/chat/{message_id}")
-def delete_post_chat(post_id: str, message_id: str):
-    from bson import ObjectId
-    if db is None:
-        raise HTTPException(status_code=500, detail="Database not available")
-    doc = db["chat"].find_one({"_id": ObjectId(message_id)})
-    if not doc or doc.get("post_id") != post_id:
+async def delete_post_chat(post_id: str, message_id: str):
+    if not await _delete_in_post("chat", post_id, message_id):
         raise HTTPException(status_code=404, detail="Message not found")
-    db["chat"].delete_one({"_id": ObjectId(message_id)})
     asyncio.create_task(_notify({"type": "chat_deleted", "post_id": post_id, "id": message_id}))
     return {"status": "deleted"}
 
@@ -707,84 +897,127 @@ async def typing_event(post_id: str, body: TypingEvent):
         "channel": body.channel,
         "author": body.author or "Someone",
         "is_typing": body.is_typing,
-        "expires_at": (datetime.now(timezone.utc) + timedelta(seconds=3)).isoformat(),
+        "expires_at": datetime.now(timezone.utc) + timedelta(seconds=3),
     }
     await _notify(payload)
     return {"status": "ok"}
 
 # ===== Mentions autocomplete =====
+# \W is the complement of str.isalnum() plus "_", i.e. exactly what handles drop
+_HANDLE_STRIP = re.compile(r"\W+")
+_MENTION_GAP = re.compile(r"[\W_]+")
+# "İ".lower() is "i" plus a combining dot, which Mongo's case-insensitive "i" does not match
+_MENTION_LETTERS = {"i": "[iİ]"}
+_MENTION_LIMIT_MAX = 50
+
+_MENTION_SOURCES = (("comment", "author"), ("chat", "author"), ("token", "page_name"))
+
+def _mention_match(term: str) -> Dict[str, Any]:
+    # A deliberate superset of the name/handle test in mentions_search, which stays the only
+    # authority: the term's letters in order, with anything else allowed between them
+    letters = _MENTION_GAP.sub("", term)
+    if not letters:
+        return {"$type": "string"}
+    pattern = r"[\W_]*".join(_MENTION_LETTERS.get(ch) or re.escape(ch) for ch in letters)
+    return {"$type": "string", "$regex": pattern, "$options": "i"}
+
 @app.get("/api/mentions")
-def mentions_search(q: Optional[str] = None, limit: int = 8):
+async def mentions_search(q: Optional[str] = None, limit: int = Query(8, ge=1, le=_MENTION_LIMIT_MAX)):
     term = (q or "").strip().lower()
     suggestions: List[Dict[str, str]] = []
     seen = set()
     if db is not None:
-        # Collect distinct authors from comments and chat
-        try:
-            authors_c = db["comment"].distinct("author")
-            authors_m = db["chat"].distinct("author")
-            names = [a for a in (authors_c + authors_m) if isinstance(a, str) and a.strip()]
-        except Exception:
-            names = []
-        # Include connected page names as well
-        try:
-            pages = db["token"].distinct("page_name")
-            pages = [p for p in pages if isinstance(p, str) and p.strip()]
-        except Exception:
-            pages = []
-        for n in names + pages:
-            key = n.strip()
-            handle = "@" + "".join(ch for ch in key.replace(" ", "_") if ch.isalnum() or ch == "_")
-            item = {"name": key, "handle": handle}
-            if term and term not in key.lower() and term not in handle.lower():
-                continue
-            if handle.lower() in seen:
-                continue
-            seen.add(handle.lower())
-            suggestions.append(item)
+        match = _mention_match(term)
+        for coll, field in _MENTION_SOURCES:
             if len(suggestions) >= limit:
                 break
+            # Distinct names in name order; handle duplicates may need more than one batch
+            pipeline = [{"$match": {field: match}}, {"$group": {"_id": "$" + field}}, {"$sort": {"_id": 1}}]
+            cursor = db[coll].aggregate(pipeline, batchSize=limit * 4)
+            try:
+                async for d in cursor:
+                    key = d["_id"].strip()
+                    if not key:
+                        continue
+                    handle = "@" + _HANDLE_STRIP.sub("", key.replace(" ", "_"))
+                    handle_l = handle.lower()
+                    if term and term not in key.lower() and term not in handle_l:
+                        continue
+                    if handle_l in seen:
+                        continue
+                    seen.add(handle_l)
+                    suggestions.append({"name": key, "handle": handle})
+                    if len(suggestions) >= limit:
+                        break
+            except Exception as e:
+                logger.warning("Mention lookup on %s failed: %s", coll, e)
+            finally:
+                with contextlib.suppress(Exception):
+                    await cursor.close()
     return {"items": suggestions}
 
 # ===== Top Posts (aggregated page visible to all social accounts) =====
+_TOPPOST_DEFAULTS: Dict[str, Any] = {k: None for k in TopPost.model_fields if k != "id"}
+_TOPPOST_DEFAULTS["platforms"] = []
+_TOPPOST_PROJECTION = {k: 1 for k in _TOPPOST_DEFAULTS}
+
+_toppost_item = _item_mapper(_TOPPOST_DEFAULTS)
+
+_TOPPOST_LIMIT_MAX = 100
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # Weak comparison over a comma-separated list: W/"x" matches "x", and "*" matches anything
+    if not if_none_match:
+        return False
+    opaque = etag.removeprefix("W/")
+    return any(t == "*" or t.removeprefix("W/") == opaque for t in (t.strip() for t in if_none_match.split(",")))
+
+async def _cached_toppost_json(request: Request, key: Any, build: Callable[[], Awaitable[bytes]]) -> Response:
+    now = time.monotonic()
+    hit = _toppost_cache.get(key)
+    if hit is None or hit[0] <= now:
+        body = await build()
+        hit = (now + _TOPPOST_CACHE_TTL, body, 'W/"%s"' % hashlib.blake2b(body, digest_size=8).hexdigest())
+        _toppost_cache.pop(key, None)
+        if len(_toppost_cache) >= _TOPPOST_CACHE_MAX:
+            # Evict the oldest entry (dicts keep insertion order)
+            del _toppost_cache[next(iter(_toppost_cache))]
+        _toppost_cache[key] = hit
+    _, body, etag = hit
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
 @app.get("/api/top-posts")
-def get_top_posts(limit: int = 20):
-    docs = get_documents("toppost", {}, limit)
-    items = []
-    for d in docs:
-        items.append(
-            {
-                "id": str(d.get("_id")),
-                "campaign_id": d.get("campaign_id"),
-                "title": d.get("title"),
-                "summary": d.get("summary"),
-                "media_url": d.get("media_url"),
-                "destination_url": d.get("destination_url"),
-                "platforms": d.get("platforms", []),
-                "created_at": d.get("created_at"),
-            }
-        )
-    return {"items": items}
+async def get_top_posts(request: Request, limit: int = Query(20, ge=1, le=_TOPPOST_LIMIT_MAX)):
+    async def build() -> bytes:
+        cursor = iter_documents("toppost", {}, limit, projection=_TOPPOST_PROJECTION)
+        return b"".join([chunk async for chunk in _stream_items(cursor, _toppost_item)])
+    return await _cached_toppost_json(request, ("list", limit), build)
 
 @app.get("/api/top-posts/{top_id}")
-def get_top_post(top_id: str):
-    doc = get_document_by_id("toppost", top_id)
-    if not doc:
-        raise HTTPException(status_code=404, detail="Top post not found")
-    return {
-        "id": str(doc.get("_id")),
-        "campaign_id": doc.get("campaign_id"),
-        "title": doc.get("title"),
-        "summary": doc.get("summary"),
-        "media_url": doc.get("media_url"),
-        "destination_url": doc.get("destination_url"),
-        "platforms": doc.get("platforms", []),
-        "created_at": doc.get("created_at"),
-    }
+async def get_top_post(request: Request, top_id: str):
+    async def build() -> bytes:
+        doc = await get_document_by_id("toppost", top_id, projection=_TOPPOST_PROJECTION)
+        if not doc:
+            raise HTTPException(status_code=404, detail="Top post not found")
+        return orjson.dumps(_toppost_item(doc))
+    return await _cached_toppost_json(request, ("one", top_id), build)
 
 # ===================== Publish =====================
+_CAMPAIGN_CREATE_FIELDS = tuple(CampaignCreate.model_fields)
+# Leaves out status, timestamps and boost counters the payload never reads
+_CAMPAIGN_CREATE_PROJECTION = dict.fromkeys(_CAMPAIGN_CREATE_FIELDS, 1)
+
+def _campaign_from_doc(doc: Dict[str, Any]) -> CampaignCreate:
+    # Stored campaigns passed validation in create_campaign; rebuild without re-validating
+    fields = {k: doc[k] for k in _CAMPAIGN_CREATE_FIELDS if k in doc}
+    fields["social_accounts"] = [SocialAccount.model_construct(**a) for a in (doc.get("social_accounts") or [])]
+    return CampaignCreate.model_construct(**fields)
+
 @app.post("/api/publish", response_model=PublishResponse)
-def publish_campaign(body: PublishRequest):
+async def publish_campaign(body: PublishRequest):
     if not body.campaign and not body.campaign_id:
         raise HTTPException(status_code=400, detail="Provide campaign or campaign_id")
 
@@ -792,63 +1025,63 @@ def publish_campaign(body: PublishRequest):
     if body.campaign:
         campaign_payload = body.campaign
     else:
-        docs = get_documents("campaign", {})
-        found = next((d for d in docs if str(d.get("_id")) == body.campaign_id), None)
+        found = await get_document_by_id("campaign", body.campaign_id, projection=_CAMPAIGN_CREATE_PROJECTION)
         if not found:
             raise HTTPException(status_code=404, detail="Campaign not found")
-        campaign_payload = CampaignCreate(**{k: found.get(k) for k in CampaignCreate.model_fields.keys()})
+        campaign_payload = _campaign_from_doc(found)
 
-    results: List[PublishResult] = []
     accounts = (campaign_payload.social_accounts or [])
     accounts = accounts[:5]
 
-    if db is not None and accounts:
-        enriched = []
-        for acc in accounts:
-            if acc.access_token:
-                enriched.append(acc)
-                continue
-            q = {"platform": acc.platform}
-            if acc.page_name:
-                q["page_name"] = acc.page_name
-            doc = db["token"].find_one(q)
-            if doc:
-                enriched.append(SocialAccount(platform=acc.platform, page_name=doc.get("page_name"), access_token=doc.get("access_token")))
-            else:
-                enriched.append(acc)
-        accounts = enriched
-
+    # Without a database or with every token supplied, skip straight to the results
+    tokens: Dict[Any, Dict[str, Any]] = {}
+    clauses = [
+        {"platform": acc.platform, "page_name": acc.page_name} if acc.page_name else {"platform": acc.platform}
+        for acc in accounts if not acc.access_token
+    ] if db is not None else []
+    if clauses:
+        if cache is None:
+            # One query for every account missing a token rather than a find_one each
+            docs = await db["token"].find({"$or": clauses}, _TOKEN_LOOKUP_PROJECTION).to_list(length=None)
+        else:
+            # Cached per platform, so take the platform's whole list and match pages below
+            docs = await _platform_tokens(list(dict.fromkeys(c["platform"] for c in clauses)))
+        for doc in docs:
+            tokens.setdefault((doc.get("platform"), doc.get("page_name")), doc)
+            # accounts without a page_name take the first token for their platform
+            tokens.setdefault((doc.get("platform"), None), doc)
+
+    # Resolve stored tokens and build results in the same pass. Plain dicts serve both
+    # the log document and the response; no validate/dump round trip
+    results: List[Dict[str, Any]] = []
+    success_count = 0
     for acc in accounts:
-        if not acc.access_token:
-            results.append(
-                PublishResult(
-                    platform=acc.platform,
-                    page_name=acc.page_name,
-                    status="error",
-                    message="Missing access token for this page",
-                )
-            )
-            continue
-        results.append(
-            PublishResult(
-                platform=acc.platform,
-                page_name=acc.page_name,
-                status="success",
-                message="Queued for publish",
-            )
-        )
+        page_name, token = acc.page_name, acc.access_token
+        if not token:
+            doc = tokens.get((acc.platform, page_name or None))
+            if doc:
+                page_name, token = doc.get("page_name"), doc.get("access_token")
+        if token:
+            success_count += 1
+            results.append({"platform": acc.platform, "page_name": page_name, "status": "success", "message": "Queued for publish"})
+        else:
+            results.append({"platform": acc.platform, "page_name": page_name, "status": "error", "message": "Missing access token for this page"})
 
     log = {
         "type": "publish",
-        "results": [r.model_dump() for r in results],
+        "results": results,
         "created_at": datetime.now(timezone.utc),
     }
-    create_document("log", log)
+    # The log is not part of the response; the flusher writes it in the next batch
+    _queue_log(log)
 
-    success_count = sum(1 for r in results if r.status == "success")
     summary = f"Prepared {success_count}/{len(results)} posts for publishing"
 
-    return PublishResponse(campaign_id=body.campaign_id, results=results, summary=summary)
+    return PublishResponse.model_construct(
+        campaign_id=body.campaign_id,
+        results=[PublishResult.model_construct(**r) for r in results],
+        summary=summary,
+    )
 
 # ===================== AI Analytics & Actions =====================
 
@@ -856,27 +1089,28 @@ def _calc_predictions(camp: Dict[str, Any]) -> Dict[str, Any]:
     daily = float(camp.get("daily_budget") or 0)
     days = int(camp.get("duration_days") or 7)
     total = float(camp.get("total_budget") or (daily * days))
-    reach = int(800 * daily * math.log(days + 1, 2) + 1000)
+    # Only the interest count and the age span feed the model, so key the cache on those
+    interests = len(camp.get("audience_interests") or [])
+    age_span = int(camp.get("audience_age_max") or 45) - int(camp.get("audience_age_min") or 18)
+    preds = _predict(daily, days, total, interests, age_span)
+    # Cached values are shared; hand out a copy so callers may mutate freely
+    return {**preds, "suggestions": list(preds["suggestions"])}
+
+@lru_cache(maxsize=1024)
+def _predict(daily: float, days: int, total: float, interests: int, age_span: int) -> Dict[str, Any]:
+    reach = int(800 * daily * math.log2(days + 1) + 1000)
     clicks = int(reach * 0.02 + daily * 15)
     ctr = round((clicks / max(1, reach)) * 100, 2)
     cpl = round(max(0.2, 1.5 - (daily / 20.0)), 2)
     leads_low = int((total / max(0.01, cpl)) * 0.6)
     leads_high = int((total / max(0.01, cpl)) * 1.1)
 
-    interests = camp.get("audience_interests") or []
-    age_min = int(camp.get("audience_age_min") or 18)
-    age_max = int(camp.get("audience_age_max") or 45)
-    risk = 0.0
-    if len(interests) < 2:
-        risk += 0.2
-    if age_max - age_min < 10:
-        risk += 0.2
-    if daily < 1:
-        risk += 0.3
+    # Each failed check contributes its weight; the comparisons count as 0 or 1
+    risk = 0.2 * (interests < 2) + 0.2 * (age_span < 10) + 0.3 * (daily < 1)
     risk = round(min(1.0, risk), 2)
 
     suggestions = []
-    if len(interests) < 3:
+    if interests < 3:
         suggestions.append("Add 3–5 interest clusters to broaden discovery.")
     if ctr < 1.5:
         suggestions.append("Test 2 more headlines to lift CTR above 1.5%.")
@@ -896,49 +1130,81 @@ def _calc_predictions(camp: Dict[str, Any]) -> Dict[str, Any]:
         "suggestions": suggestions,
     }
 
+# Just what _calc_predictions and _build_share_urls read
+_ANALYTICS_PROJECTION = dict.fromkeys((
+    "daily_budget", "duration_days", "total_budget", "audience_interests", "audience_age_min",
+    "audience_age_max", "destination_url", "headline", "primary_text",
+), 1)
+
 @app.get("/api/campaigns/{campaign_id}/analytics", response_model=CampaignAnalytics)
-def campaign_analytics(campaign_id: str):
-    doc = get_document_by_id("campaign", campaign_id)
+async def campaign_analytics(campaign_id: str):
+    doc = await get_document_by_id("campaign", campaign_id, projection=_ANALYTICS_PROJECTION)
     if not doc:
         raise HTTPException(status_code=404, detail="Campaign not found")
     preds = _calc_predictions(doc)
     share_urls = _build_share_urls(doc)
-    return CampaignAnalytics(campaign_id=campaign_id, share_urls=share_urls, **preds)
+    # _calc_predictions already returns the exact field types
+    return CampaignAnalytics.model_construct(campaign_id=campaign_id, share_urls=share_urls, **preds)
+
+@app.post("/api/campaigns/analytics/bulk", response_model=List[CampaignAnalytics])
+async def bulk_campaign_analytics(body: BulkAnalyticsRequest):
+    if db is None:
+        raise HTTPException(status_code=500, detail="Database not available")
+    # One $in query for the whole dashboard; unknown or malformed ids are left out
+    ids = [i for i in dict.fromkeys(body.campaign_ids) if is_object_id(i)]
+    by_id: Dict[str, Dict[str, Any]] = {}
+    async for doc in db["campaign"].find({"_id": {"$in": [ObjectId(i) for i in ids]}}, _ANALYTICS_PROJECTION):
+        cid = str(doc["_id"])
+        by_id[cid] = {"campaign_id": cid, **_calc_predictions(doc), "share_urls": _build_share_urls(doc)}
+    return ORJSONResponse([by_id[i] for i in ids if i in by_id])
+
+# Existence checks need no fields back
+_ID_ONLY = {"_id": 1}
 
 @app.post("/api/campaigns/{campaign_id}/boost")
-def boost_campaign(campaign_id: str):
-    if not get_document_by_id("campaign", campaign_id):
+async def boost_campaign(campaign_id: str):
+    if not await get_document_by_id("campaign", campaign_id, projection=_ID_ONLY):
         raise HTTPException(status_code=404, detail="Campaign not found")
-    update_document("campaign", campaign_id, {"boosts": int(datetime.now().timestamp())})
-    create_document("log", {"type": "boost", "campaign_id": campaign_id, "created_at": datetime.now(timezone.utc)})
+    now = datetime.now(timezone.utc)
+    await update_document("campaign", campaign_id, {"boosts": int(now.timestamp()), "updated_at": now})
+    _queue_log({"type": "boost", "campaign_id": campaign_id, "created_at": now})
     return {"status": "ok", "message": "Boost scheduled — budget concentration and frequency cap adjustments queued."}
 
 @app.post("/api/campaigns/{campaign_id}/viral")
-def viral_push(campaign_id: str):
-    if not get_document_by_id("campaign", campaign_id):
+async def viral_push(campaign_id: str):
+    if not await get_document_by_id("campaign", campaign_id, projection=_ID_ONLY):
         raise HTTPException(status_code=404, detail="Campaign not found")
-    update_document("campaign", campaign_id, {"viral_pushes": int(datetime.now().timestamp())})
-    create_document("log", {"type": "viral", "campaign_id": campaign_id, "created_at": datetime.now(timezone.utc)})
+    now = datetime.now(timezone.utc)
+    await update_document("campaign", campaign_id, {"viral_pushes": int(now.timestamp()), "updated_at": now})
+    _queue_log({"type": "viral", "campaign_id": campaign_id, "created_at": now})
     return {"status": "ok", "message": "Viral push initiated — top creatives will be re-promoted across platforms."}
 
 # Social share links
 
+_SHARE_TEMPLATES = (
+    ("facebook", "https://www.facebook.com/sharer/sharer.php?u=%(url)s"),
+    ("twitter", "https://twitter.com/intent/tweet?text=%(text)s&url=%(url)s"),
+    ("linkedin", "https://www.linkedin.com/sharing/share-offsite/?url=%(url)s"),
+    ("whatsapp", "https://api.whatsapp.com/send?text=%(both)s"),
+    ("telegram", "https://t.me/share/url?url=%(url)s&text=%(text)s"),
+)
+
+@lru_cache(maxsize=1024)
+def _share_urls_cached(url: str, text: str) -> tuple:
+    # Analytics and share polling hit the same campaign repeatedly; pairs keep the cached value immutable
+    quoted = {"url": quote_plus(url), "text": quote_plus(text), "both": quote_plus(text + " " + url)}
+    return tuple((name, tpl % quoted) for name, tpl in _SHARE_TEMPLATES)
+
+_SHARE_PROJECTION = dict.fromkeys(("destination_url", "headline", "primary_text"), 1)
+
 def _build_share_urls(camp: Dict[str, Any]) -> Dict[str, str]:
-    from urllib.parse import quote_plus
     url = camp.get("destination_url") or "https://nexus-ads.app"
     text = camp.get("headline") or camp.get("primary_text") or "Check this out"
-    share = {
-        "facebook": f"https://www.facebook.com/sharer/sharer.php?u={quote_plus(url)}",
-        "twitter": f"https://twitter.com/intent/tweet?text={quote_plus(text)}&url={quote_plus(url)}",
-        "linkedin": f"https://www.linkedin.com/sharing/share-offsite/?url={quote_plus(url)}",
-        "whatsapp": f"https://api.whatsapp.com/send?text={quote_plus(text + ' ' + url)}",
-        "telegram": f"https://t.me/share/url?url={quote_plus(url)}&text={quote_plus(text)}",
-    }
-    return share
+    return dict(_share_urls_cached(url, text))
 
 @app.get("/api/campaigns/{campaign_id}/share")
-def share_links(campaign_id: str):
-    doc = get_document_by_id("campaign", campaign_id)
+async def share_links(campaign_id: str):
+    doc = await get_document_by_id("campaign", campaign_id, projection=_SHARE_PROJECTION)
     if not doc:
         raise HTTPException(status_code=404, detail="Campaign not found")
     return {"campaign_id": campaign_id, "share_urls": _build_share_urls(doc)}
@@ -947,4 +1213,8 @@ def share_links(campaign_id: str):
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # Workers need an import string so each process builds its own app, Mongo pool and event loop.
+    # SSE fan-out is in-process, so realtime events only reach clients of the worker that emitted them.
+    workers = int(os.getenv("WEB_CONCURRENCY", 1))
+    # uvicorn's "auto" loop/http already pick uvloop and httptools when installed (uvloop is not on Windows)
+    uvicorn.run("main:app", host="0.0.0.0", port=port, workers=workers)